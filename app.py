@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 import os
+from concurrent.futures import ThreadPoolExecutor
 import aws_cdk as cdk
-from main.main_stack import MainStack
+from main.main_stack import MainStack, get_lambda_image_digest
 from base.base_stack import BaseStack
 from base.regional_base_stack import RegionalBaseStack
 
@@ -23,14 +24,43 @@ else:
     raise Exception("Invalid env var: env")
 
 
-app = cdk.App()
+# Skip capturing a JS stack trace for every construct annotation
+app = cdk.App(stack_traces=False)
+
+# Only build the regional stacks of the targeted region, if one is given, e.g.
+# `cdk deploy -c targetRegion=us-west-1 MainStack-us-west-1`
+_TARGET_REGION = app.node.try_get_context("targetRegion") or os.getenv(
+    "CDK_TARGET_REGION"
+)
+if not _TARGET_REGION:
+    _STACK_REGIONS = _REGIONS
+elif _TARGET_REGION in _REGIONS:
+    _STACK_REGIONS = [_TARGET_REGION]
+else:
+    raise Exception(f"Invalid target region: {_TARGET_REGION}")
+
+# The ECR lookups are plain network calls, so run them in the background
+# while the (single-threaded) jsii construct tree is being built.
+executor = ThreadPoolExecutor(max_workers=len(_STACK_REGIONS))
+image_digests = {
+    region: executor.submit(get_lambda_image_digest, env_, region)
+    for region in _STACK_REGIONS
+}
+executor.shutdown(wait=False)
+
+# one environment per region, shared by every stack deployed there
+_ENVS = {
+    region: cdk.Environment(account=_ACCOUNT, region=region)
+    for region in dict.fromkeys([_REGION_1, *_STACK_REGIONS])
+}
 
 base_stack = BaseStack(
     app,
     "BaseStack" if env_ == "dev" else "BaseStack-prod",
     prefix=_PREFIX,
+    domain_name=DOMAIN_NAME,
     regions=_REGIONS,
-    env=cdk.Environment(account=_ACCOUNT, region=_REGION_1),
+    env=_ENVS[_REGION_1],
     tags={
         "stack": "base",
         "domain": DOMAIN_NAME,
@@ -43,22 +73,23 @@ base = {
         f"RegionalBase-{region}" if env_ == "dev" else f"RegionalBase-{region}-prod",
         prefix=_PREFIX,
         region=region,
-        env=cdk.Environment(account=_ACCOUNT, region=region),
+        env=_ENVS[region],
         tags={
             "stack": "regional",
             "domain": DOMAIN_NAME,
             "region": region,
         },
     )
-    for region in _REGIONS
+    for region in _STACK_REGIONS
 }
 
-for region in _REGIONS:
+for region in _STACK_REGIONS:
     MainStack(
         app,
         f"MainStack-{region}" if env_ == "dev" else f"MainStack-{region}-prod",
         prefix=_PREFIX,
         domain_name=DOMAIN_NAME,
+        hosted_zone_id=base_stack.hosted_zone.hosted_zone_id,
         account_number=_ACCOUNT,
         region_name=region,
         other_regions=[x for x in _REGIONS if x != region],
@@ -68,7 +99,8 @@ for region in _REGIONS:
         },
         vpc=base[f"RegionalBase-{region}"].vpc,
         env_=env_,
-        env=cdk.Environment(account=_ACCOUNT, region=region),
+        lambda_image_digest=image_digests[region].result(),
+        env=_ENVS[region],
         tags={
             "stack": "main",
             "domain": DOMAIN_NAME,
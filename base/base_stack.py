@@ -2,6 +2,7 @@ from typing import List
 from tagging import add_tags
 from aws_cdk import (
     aws_dynamodb as dynamodb,
+    aws_route53 as route53,
     aws_secretsmanager as sm,
     RemovalPolicy,
     Stack,
@@ -15,6 +16,7 @@ class BaseStack(Stack):
         scope: Construct,
         construct_id: str,
         prefix: str,
+        domain_name: str,
         regions: List[str],
         **kwargs,
     ) -> None:
@@ -39,6 +41,13 @@ class BaseStack(Stack):
             removal_policy=RemovalPolicy.RETAIN,
         )
 
+        # DNS (hosted zones are global, so one lookup serves every region)
+        self.hosted_zone = route53.HostedZone.from_lookup(
+            self,
+            "HostedZone",
+            domain_name=domain_name,
+        )
+
     def create_table(
         self, id: str, name: str, enable_ttl: bool = True, ttl_atribute: str = "ttl"
     ):
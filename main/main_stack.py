@@ -1,4 +1,6 @@
-from typing import NamedTuple, Tuple, List, Dict
+import json
+from operator import attrgetter
+from typing import NamedTuple, Tuple, List, Dict, TypeVar
 from tagging import add_tags
 import aws_cdk as cdk
 from aws_cdk import (
@@ -22,7 +24,6 @@ from aws_cdk import (
 )
 from constructs import Construct
 from enum import Enum
-import boto3
 
 
 class LambdaQueueTuple(NamedTuple):
@@ -40,14 +41,64 @@ _READ = Permission.READ
 _WRITE = Permission.WRITE
 _READ_WRITE = Permission.READ_WRITE
 
+# grant method to call on an ITable / IBucket for each permission
+_TABLE_GRANTS = {
+    _READ: "grant_read_data",
+    _WRITE: "grant_write_data",
+    _READ_WRITE: "grant_read_write_data",
+}
+# not part of CDK's data grants, but used by the handlers' `execute_statement`
+_PARTIQL_ACTIONS = [
+    "dynamodb:PartiQLSelect",
+    "dynamodb:PartiQLInsert",
+    "dynamodb:PartiQLUpdate",
+    "dynamodb:PartiQLDelete",
+]
+_BUCKET_GRANTS = {
+    _READ: "grant_read",
+    _WRITE: "grant_write",
+    _READ_WRITE: "grant_read_write",
+}
+
+T = TypeVar("T")
+
 _ACM_FULL_PERMISSION_POLICY = "AWSCertificateManagerFullAccess"
-_SQS_FULL_PERMISSION_POLICY = "AmazonSQSFullAccess"
-_ROUTE_53_FULL_PERMISSION_POLICY = "AmazonRoute53FullAccess"
 _APIGW_FULL_PERMISSION_POLICY = "AmazonAPIGatewayAdministrator"
 _IAM_FULL_PERMISSION_POLICY = "IAMFullAccess"
 _SNS_FULL_PERMISSION_POLICY = "AmazonSNSFullAccess"
+# same actions as `IBucket.grant_read_write`
+_BUCKET_READ_WRITE_ACTIONS = [
+    "s3:GetObject*",
+    "s3:GetBucket*",
+    "s3:List*",
+    "s3:DeleteObject*",
+    "s3:PutObject",
+    "s3:PutObjectLegalHold",
+    "s3:PutObjectRetention",
+    "s3:PutObjectTagging",
+    "s3:PutObjectVersionTagging",
+    "s3:Abort*",
+]
+
+# resolved once instead of once per lambda
+_PYTHON_RUNTIME = lambda_.Runtime.PYTHON_3_10
+# pure-python lambdas run on Graviton; preprocessing keeps x86_64 for the
+# AWSSDKPandas layer's native wheels
+_ARM_64 = lambda_.Architecture.ARM_64
+# the external pyjwt layer is only known to work on x86_64 (it may bundle native
+# `cryptography` wheels), so lambdas using it stay there until it's rebuilt
+_X86_64 = lambda_.Architecture.X86_64
+_API_LAMBDA_TIMEOUT = Duration.seconds(29)
+# init (boto3/pyjwt imports) is CPU bound, and CPU scales with memory
+_DEFAULT_MEMORY_SIZE = 512
+_INTERACTIVE_MEMORY_SIZE = 1024
+
+# local build artifacts that would otherwise change the asset hash
+_ASSET_EXCLUDES = ["**/__pycache__", "*.pyc", "*.md"]
 
 _JWT_SECRET_NAME = "jwt_secret"
+# see layers/common/python/helpers/cors.py
+_CORS_HEADERS = ["Content-Type", "Authorization", "access_key", "secret_key"]
 _USER_API = "user-api"
 
 
@@ -61,57 +112,348 @@ _PANDAS_LAYER = {
 }
 
 
+class RouteSpec(NamedTuple):
+    """A lambda-backed API method, referring to MainStack attributes by name."""
+
+    path: str
+    http_method: str
+    resource_name: str
+    filename: str
+    tables: Tuple[Tuple[str, Permission], ...] = ()
+    buckets: Tuple[Tuple[str, Permission], ...] = ()
+    create_queue: bool = False
+    # env var name -> dotted MainStack attribute holding its value
+    environment: Tuple[Tuple[str, str], ...] = ()
+    policies: Tuple[str, ...] = ()
+    managed_policies: Tuple[str, ...] = ()
+    # key of the route in the dict returned by `create_api_gateway_and_lambdas`
+    name: str | None = None
+    # routes naming the same function share one lambda (see src/dispatch.py)
+    function: str | None = None
+    memory_size: int = _DEFAULT_MEMORY_SIZE
+    # warm instances kept behind the "live" alias that API Gateway invokes
+    provisioned: int | None = None
+
+
+_ROUTES = [
+    # users
+    RouteSpec(
+        "/users",
+        "POST",
+        "users",
+        "users_POST",
+        tables=(("users", _READ_WRITE), ("creds", _READ_WRITE)),
+        create_queue=True,
+        environment=(
+            ("domain_name", "domain_name"),
+            ("hosted_zone_id", "hosted_zone.hosted_zone_id"),
+        ),
+        managed_policies=(_ACM_FULL_PERMISSION_POLICY,),
+        name="POST_signup",
+    ),
+    # sign-in
+    RouteSpec(
+        "/sign-in",
+        "POST",
+        "sign-in",
+        "signin_POST",
+        tables=(("users", _READ), ("creds", _READ_WRITE), ("models", _READ_WRITE)),
+        memory_size=_INTERACTIVE_MEMORY_SIZE,
+        provisioned=2,
+    ),
+    # sessions
+    RouteSpec(
+        "/sessions",
+        "POST",
+        "sessions",
+        "sessions_POST",
+        tables=(("users", _READ), ("creds", _READ_WRITE), ("models", _READ_WRITE)),
+        memory_size=_INTERACTIVE_MEMORY_SIZE,
+        provisioned=2,
+        name="POST_signin",
+    ),
+    # apikeys
+    RouteSpec(
+        "/api-keys",
+        "GET",
+        "api-keys",
+        "api_keys_list_GET",
+        tables=(
+            ("users", _READ),
+            ("creds", _READ),
+            ("usages", _READ),
+            ("models", _READ_WRITE),
+        ),
+        function="api_keys",
+    ),
+    RouteSpec(
+        "/api-keys",
+        "POST",
+        "api-keys",
+        "api_keys_POST",
+        tables=(
+            ("users", _READ),
+            ("creds", _READ),
+            ("usages", _READ),
+            ("models", _READ_WRITE),
+        ),
+        function="api_keys",
+    ),
+    RouteSpec(
+        "/api-keys/{api_key}",
+        "DELETE",
+        "api-keys",
+        "api_keys_DELETE",
+        tables=(
+            ("users", _READ),
+            ("creds", _READ),
+            ("usages", _READ),
+            ("models", _READ_WRITE),
+        ),
+        function="api_keys",
+    ),
+    # credentials
+    # Note: need read-write permission for GET due to use of PartiQL
+    RouteSpec(
+        "/credentials",
+        "GET",
+        "credentials",
+        "credentials_GET",
+        tables=(("users", _READ), ("creds", _READ_WRITE)),
+        name="GET_creds",
+        function="credentials",
+    ),
+    RouteSpec(
+        "/credentials",
+        "POST",
+        "credentials",
+        "credentials_POST",
+        tables=(("users", _READ), ("creds", _READ_WRITE)),
+        function="credentials",
+    ),
+    RouteSpec(
+        "/credentials/{credential_name}",
+        "DELETE",
+        "credentials",
+        "credentials_DELETE",
+        tables=(("users", _READ), ("creds", _READ_WRITE)),
+        function="credentials",
+    ),
+    # ml-models
+    RouteSpec(
+        "/ml-models/{model_name}",
+        "DELETE",
+        "ml-models",
+        "ml_models_DELETE",
+        tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+        policies=("models_read_write_policy",),
+        managed_policies=(_IAM_FULL_PERMISSION_POLICY, _APIGW_FULL_PERMISSION_POLICY),
+        name="DELETE_ml_models",
+    ),
+    RouteSpec(
+        "/ml-models/{model_name}",
+        "PUT",
+        "ml-models",
+        "ml_models_PUT",
+        tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+        buckets=(("staging_bucket", _READ_WRITE),),
+        managed_policies=(_APIGW_FULL_PERMISSION_POLICY,),
+        name="PUT_ml_models",
+    ),
+    RouteSpec(
+        "/ml-models/{model_name}",
+        "POST",
+        "ml-models",
+        "ml_models_POST",
+        tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+        buckets=(("staging_bucket", _READ_WRITE),),
+        managed_policies=(_APIGW_FULL_PERMISSION_POLICY,),
+    ),
+    RouteSpec(
+        "/ml-models/{model_name}",
+        "GET",
+        "ml-models",
+        "ml_models_GET",
+        tables=(
+            ("users", _READ),
+            ("creds", _READ),
+            ("usages", _READ_WRITE),
+            ("models", _READ_WRITE),
+        ),
+        buckets=(("models_bucket", _READ),),
+        name="GET_ml_models",
+    ),
+    RouteSpec(
+        "/ml-models",
+        "GET",
+        "ml-models",
+        "ml_models_list_GET",
+        tables=(
+            ("users", _READ),
+            ("creds", _READ),
+            ("usages", _READ),
+            ("models", _READ_WRITE),
+        ),
+        name="GET_list_of_ml_models",
+    ),
+    # # ml-models preprocessing function
+    # RouteSpec(
+    #     "/ml-models/{model_name}/preprocessing",
+    #     "DELETE",
+    #     "preprocessing",
+    #     "preprocessing_DELETE",
+    #     tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+    #     policies=("models_read_write_policy",),
+    #     managed_policies=(_IAM_FULL_PERMISSION_POLICY, _APIGW_FULL_PERMISSION_POLICY),
+    # ),
+    # RouteSpec(
+    #     "/ml-models/{model_name}/preprocessing",
+    #     "PUT",
+    #     "preprocessing",
+    #     "preprocessing_PUT",
+    #     tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+    #     buckets=(("staging_bucket", _READ_WRITE),),
+    #     managed_policies=(_APIGW_FULL_PERMISSION_POLICY,),
+    # ),
+    # RouteSpec(
+    #     "/ml-models/{model_name}/preprocessing",
+    #     "POST",
+    #     "preprocessing",
+    #     "preprocessing_POST",
+    #     tables=(("users", _READ), ("creds", _READ), ("models", _READ_WRITE)),
+    #     buckets=(("staging_bucket", _READ_WRITE),),
+    #     managed_policies=(_APIGW_FULL_PERMISSION_POLICY,),
+    # ),
+    # RouteSpec(
+    #     "/ml-models/{model_name}/preprocessing",
+    #     "GET",
+    #     "preprocessing",
+    #     "preprocessing_GET",
+    #     tables=(
+    #         ("users", _READ),
+    #         ("creds", _READ),
+    #         ("usages", _READ_WRITE),
+    #         ("models", _READ_WRITE),
+    #     ),
+    #     buckets=(("models_bucket", _READ),),
+    # ),
+    # ml-models - logs
+    RouteSpec(
+        "/ml-models/{model_name}/logs",
+        "GET",
+        "ml-models-logs",
+        "ml_models_logs_list_GET",
+        tables=(("users", _READ), ("creds", _READ), ("usages", _READ_WRITE)),
+    ),
+    RouteSpec(
+        "/ml-models/{model_name}/logs/{log_timestamp}",
+        "GET",
+        "ml-models-logs",
+        "ml_models_logs_GET",
+        tables=(("users", _READ), ("creds", _READ), ("usages", _READ_WRITE)),
+        buckets=(("logs_bucket", _READ_WRITE),),
+    ),
+]
+
+# path -> (allowed methods, extra allowed headers) of each CORS preflight
+_CREDENTIALS_HEADERS = ["credentials_name", "description"]
+_CORS_PREFLIGHTS: Dict[str, Tuple[List[str] | None, List[str] | None]] = {
+    "/users": (["POST"], None),
+    "/sign-in": (["POST"], None),
+    "/sessions": (["POST"], ["username", "password"]),
+    "/api-keys": (None, None),
+    "/api-keys/{api_key}": (None, None),
+    "/credentials": (["GET", "DELETE", "POST"], _CREDENTIALS_HEADERS),
+    "/credentials/{credential_name}": (["DELETE"], _CREDENTIALS_HEADERS),
+    "/ml-models": (None, None),
+    "/ml-models/{model_name}": (None, None),
+    # "/ml-models/{model_name}/preprocessing": (None, None),
+    "/ml-models/{model_name}/logs": (["GET"], None),
+    "/ml-models/{model_name}/logs/{log_timestamp}": (["GET"], None),
+}
+
+
+def merge_permissions(
+    grants: List[Tuple[T, Permission]] | None
+) -> List[Tuple[T, Permission]]:
+    """Collapse repeated resources into a single (resource, permission) pair."""
+    merged: Dict[T, Permission] = {}
+    for resource, permission in grants or []:
+        if merged.get(resource, permission) != permission:
+            permission = _READ_WRITE
+        merged[resource] = permission
+    return list(merged.items())
+
+
+def grant_table(
+    table: dynamodb.ITable, permission: Permission, grantee: iam.IGrantable
+) -> None:
+    """Grant `permission` on `table`, read-write including PartiQL statements."""
+    getattr(table, _TABLE_GRANTS[permission])(grantee)
+    if permission == _READ_WRITE:
+        table.grant(grantee, *_PARTIQL_ACTIONS)
+
+
+def get_lambda_image_digest(env_: str, region_name: str) -> str:
+    """Return the digest of the `latest` lambda runtime image in ECR."""
+    # boto3 is only needed for this lookup, so import it here
+    import boto3
+
+    repo_name = "lambda_runtime" if env_ == "dev" else "neuro"
+    ecr = boto3.Session(
+        profile_name="dev",
+        region_name=region_name,
+    ).client("ecr")
+    return next(
+        image["imageDigest"]
+        for image in ecr.list_images(repositoryName=repo_name)["imageIds"]
+        if image.get("imageTag", "") == "latest"
+    )
+
+
 class RouteResource:
-    def __init__(self, paths: list[str], resource: apigw.Resource):
-        self.routes = {}
+    def __init__(self, paths: list[str], resource: apigw.IResource):
+        self.routes: Dict[str, apigw.IResource] = {"/": resource}
         for path in sorted(paths):
-            nodes = ("root" + path).rstrip("/").split("/")
-            self.add_child(self.routes, nodes, resource)
-
-    def add_child(self, curr: dict, nodes: list[str], resource: apigw.Resource):
-        # base case
-        if not nodes:
-            return
-
-        # special rule for "root"
-        node = "/" if nodes[0] == "root" else nodes[0]
-
-        # recurse
-        if node == "/" and node not in curr:
-            curr[node] = {"_parent": curr, "_resource": resource}
-        if node not in curr:
-            # add resource
-            resource = resource.add_resource(node)
-
-            curr[node] = {"_parent": curr, "_resource": resource}
-        try:
-            self.add_child(curr[node], nodes[1:], curr[node]["_resource"])
-        except Exception as err:
-            print("err: ", err)
-            print("node: ", node)
-            print("self.routes: ", self.routes)
-            raise Exception("Some error", err=err, node=node, routes=self.routes)
+            self.resource_for(path)
+
+    def resource_for(self, path: str) -> apigw.IResource:
+        # resources are cached by path, so each one is only created once
+        path = path.rstrip("/") or "/"
+        resource = self.routes.get(path)
+        if resource is None:
+            parent, _, node = path.rpartition("/")
+            resource = self.resource_for(parent).add_resource(node)
+            self.routes[path] = resource
+        return resource
 
     def get(self, route: str) -> apigw.IResource:
-        target = self.routes
-        nodes = ("root" + route).rstrip("/").split("/")
-        while nodes:
-            node = "/" if nodes[0] == "root" else nodes[0]
-            if nodes:
-                nodes = nodes[1:]
-                target = target[node]
-        return target["_resource"]
+        return self.routes[route.rstrip("/") or "/"]
 
 
 class MainStack(Stack):
     def import_dynamodb_table(self, name: str) -> dynamodb.ITable:
-        return dynamodb.Table.from_table_name(self, name, f"{self.prefix}_{name}")
+        # importing the same name twice would clash on the construct id
+        table = self._tables.get(name)
+        if table is not None:
+            return table
+        table_name = f"{self.prefix}_{name}"
+        table = dynamodb.Table.from_table_name(self, name, table_name)
+        self._tables[name] = table
+
+        # keep the name/ARN as plain strings so lambda environments don't
+        # have to read them back from the imported table
+        table_arn = self.format_arn(
+            service="dynamodb", resource="table", resource_name=table_name
+        )
+        self._table_meta[table] = (table_name, table_arn)
+        return table
 
     def import_databases(self):
-        self.users: dynamodb.ITable = self.import_dynamodb_table("Users")
-        self.creds: dynamodb.ITable = self.import_dynamodb_table("Creds")
-        self.models: dynamodb.ITable = self.import_dynamodb_table("Models")
-        self.usages: dynamodb.ITable = self.import_dynamodb_table("Usages")
+        self.users, self.creds, self.models, self.usages = [
+            self.import_dynamodb_table(name)
+            for name in ("Users", "Creds", "Models", "Usages")
+        ]
 
     def import_secrets(self):
         self.jwt_secret = sm.Secret.from_secret_name_v2(
@@ -120,6 +462,23 @@ class MainStack(Stack):
             secret_name=_JWT_SECRET_NAME,
         )
 
+        # shared by every lambda that validates JWTs, instead of one
+        # `grant_read` statement per lambda role
+        self.jwt_read_policy = iam.ManagedPolicy(
+            self,
+            "jwt_read_policy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=[
+                        "secretsmanager:GetSecretValue",
+                        "secretsmanager:DescribeSecret",
+                    ],
+                    # secrets imported by name are matched with a wildcard suffix
+                    resources=[f"{self.jwt_secret.secret_arn}-??????"],
+                )
+            ],
+        )
+
     def import_lambda_layers(self):
         jwt_layer_arn = {
             "prod": {
@@ -138,14 +497,44 @@ class MainStack(Stack):
             layer_version_arn=jwt_layer_arn[self.env_][self.region],
         )
 
-    def import_hosted_zone(self) -> route53.IHostedZone:
-        zone = route53.HostedZone.from_lookup(
+    def managed_policy(self, name: str) -> iam.IManagedPolicy:
+        # the same AWS managed policies are attached to several roles
+        policy = self._managed_policies.get(name)
+        if policy is None:
+            policy = iam.ManagedPolicy.from_aws_managed_policy_name(name)
+            self._managed_policies[name] = policy
+        return policy
+
+    def lambda_integration(self, _lambda: lambda_.IFunction) -> apigw.LambdaIntegration:
+        # one integration per function, however many methods it serves
+        integration = self._integrations.get(_lambda)
+        if integration is None:
+            integration = apigw.LambdaIntegration(_lambda)
+            self._integrations[_lambda] = integration
+        return integration
+
+    def import_hosted_zone(self, hosted_zone_id: str) -> route53.IHostedZone:
+        zone = route53.HostedZone.from_hosted_zone_attributes(
             self,
             "HostedZone",
-            domain_name=self.domain_name,
+            hosted_zone_id=hosted_zone_id,
+            zone_name=self.domain_name,
         )
         return zone
 
+    def create_fifo_queue(
+        self, id: str, content_based_deduplication: bool = False
+    ) -> sqs.Queue:
+        return sqs.Queue(
+            self,
+            id,
+            visibility_timeout=Duration.minutes(15),
+            retention_period=Duration.hours(12),
+            fifo=True,
+            content_based_deduplication=content_based_deduplication,
+            deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
+        )
+
     def create_lambda(
         self,
         id: str,
@@ -153,45 +542,45 @@ class MainStack(Stack):
         buckets: List[Tuple[s3.Bucket, Permission]] | None = None,
         layers: List[lambda_.ILayerVersion] | None = None,
         queue: sqs.Queue | None = None,
+        handler: str | None = None,
+        extra_env: Dict[str, str] | None = None,
+        memory_size: int = _DEFAULT_MEMORY_SIZE,
     ) -> lambda_.IFunction:
+        # one grant per table/bucket
+        tables = merge_permissions(tables)
+        buckets = merge_permissions(buckets)
+
         # environment variables for the lambda function
-        env = {table.table_name: table.table_arn for (table, _) in tables or []}
+        env = dict(self._table_meta[table] for (table, _) in tables)
         env["region_name"] = self.region_name
         env["prefix"] = self.prefix
         if queue:
             env["queue"] = queue.queue_url
+        env.update(extra_env or {})
 
         # create lambda function
         _lambda = lambda_.Function(
             self,
             id,
             function_name=f"{self.prefix}_{id}",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
-            handler=f"{id}.handler",
+            runtime=_PYTHON_RUNTIME,
+            architecture=_X86_64 if self.py_jwt_layer in (layers or []) else _ARM_64,
+            code=self.src_code,
+            handler=handler or f"{id}.handler",
             environment=env,
-            timeout=Duration.seconds(29),
-            layers=layers or [],
+            timeout=_API_LAMBDA_TIMEOUT,
+            memory_size=memory_size,
+            layers=[self.common_layer, *(layers or [])],
         )
         add_tags(_lambda, {"lambda": id})
 
         # grant lambda function access to DynamoDB tables
-        for table, permission in tables or []:
-            if permission == _READ:
-                table.grant_read_data(_lambda)
-            elif permission == _WRITE:
-                table.grant_write_data(_lambda)
-            else:
-                table.grant_full_access(_lambda)
+        for table, permission in tables:
+            grant_table(table, permission, _lambda)
 
         # grant lambda function access to S3 buckets
-        for bucket, permission in buckets or []:
-            if permission == _READ:
-                bucket.grant_read(_lambda)
-            elif permission == _WRITE:
-                bucket.grant_write(_lambda)
-            else:
-                bucket.grant_read_write(_lambda)
+        for bucket, permission in buckets:
+            getattr(bucket, _BUCKET_GRANTS[permission])(_lambda)
 
         return _lambda
 
@@ -206,47 +595,74 @@ class MainStack(Stack):
         secrets: List[Tuple[str, sm.ISecret]] | None = None,
         layers: List[lambda_.ILayerVersion] | None = None,
         create_queue: bool = False,
+        extra_env: Dict[str, str] | None = None,
+        memory_size: int = _DEFAULT_MEMORY_SIZE,
+        provisioned: int | None = None,
+        reuse: lambda_.IFunction | None = None,
     ) -> LambdaQueueTuple:
         resource = self.resources.get(path)
 
-        # create lambda
+        # create lambda (unless the route is served by an existing, already
+        # configured one)
         _id = f"{resource_name}_{http_method}"
+        # SQS derives the deduplication id from the message body, so senders
+        # don't have to supply one
         _queue = (
-            sqs.Queue(
-                self,
-                resource_name,
-                visibility_timeout=Duration.minutes(15),
-                retention_period=Duration.hours(12),
-                fifo=True,
-                content_based_deduplication=False,
-                deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
-            )
+            self.create_fifo_queue(resource_name, content_based_deduplication=True)
             if create_queue
             else None
         )
         if _queue:
             add_tags(_queue, {"queue": resource_name})
 
-        _lambda = self.create_lambda(
+        _lambda = reuse or self.create_lambda(
             _id if not filename_overwrite else filename_overwrite,
             tables=tables,
             buckets=buckets,
             layers=layers,
             queue=_queue,
+            extra_env={
+                **{name: secret.secret_name for name, secret in secrets or []},
+                **(extra_env or {}),
+            },
+            memory_size=memory_size,
         )
         if _queue:
             _queue.grant_send_messages(_lambda)
 
-        # add method to resource as proxy to _lambda
-        resource.add_method(http_method, apigw.LambdaIntegration(_lambda))
+        # add method to resource as proxy to _lambda, or to its provisioned
+        # "live" alias
+        target = _lambda
+        if provisioned:
+            target = _lambda.add_alias(
+                "live", provisioned_concurrent_executions=provisioned
+            )
+        resource.add_method(http_method, self.lambda_integration(target))
 
         # grant lambda permission to read secret
-        for secret_name, secret in secrets or []:
-            secret.grant_read(_lambda)
-            _lambda.add_environment(secret_name, secret.secret_name)
+        for _, secret in secrets or []:
+            if secret is self.jwt_secret:
+                _lambda.role.add_managed_policy(self.jwt_read_policy)
+            else:
+                secret.grant_read(_lambda)
 
         return LambdaQueueTuple(_lambda, _queue)
 
+    def add_cors_preflight(
+        self,
+        path: str,
+        methods: List[str] | None = None,
+        additional_headers: List[str] | None = None,
+    ):
+        """Answer OPTIONS requests on `path` with an API Gateway MOCK integration."""
+        self.resources.get(path).add_cors_preflight(
+            allow_origins=["*"],
+            allow_methods=methods or ["*"],
+            allow_headers=_CORS_HEADERS + (additional_headers or []),
+            allow_credentials=True,
+            status_code=204,
+        )
+
     def create_cert_for_domain(self) -> acm.Certificate:
         cert = acm.Certificate(
             self,
@@ -258,546 +674,199 @@ class MainStack(Stack):
 
         return cert
 
-    def create_api_gateway_and_lambdas(
-        self,
-    ) -> Tuple[apigw.RestApi, Dict[str, LambdaQueueTuple]]:
-        # create resources
-        api = apigw.RestApi(
-            self,
-            id=f"{self.prefix}_api",
-            endpoint_types=[apigw.EndpointType.REGIONAL],
-        )
-        add_tags(api, {"api": f"{self.prefix}_api"})
-
-        self.resources = RouteResource(
-            resource=api.root,
-            paths=[
-                "/",
-                "/sign-in",
-                "/api-keys",
-                "/api-keys/{api_key}",
-                "/credentials",
-                "/credentials/{credential_name}",
-                "/ml-models",
-                "/ml-models/{model_name}",
-                # "/ml-models/{model_name}/preprocessing",
-                "/ml-models/{model_name}/logs",
-                "/ml-models/{model_name}/logs/{log_timestamp}",
-                "/sessions",
-                "/users",
-            ],
-        )
-
-        # set up custom domain
+    def create_api_domain(
+        self, id: str, record_id: str, subdomain: str
+    ) -> apigw.DomainName:
         domain_name = apigw.DomainName(
             self,
-            f"{self.domain_name}_domain_name",
-            mapping=api,
+            id,
             certificate=self.main_cert,
-            domain_name=f"{_USER_API}.{self.domain_name}",
-        )
-
-        # users
-        POST_users = self.add(
-            "/users",
-            "POST",
-            "users",
-            filename_overwrite="users_POST",
-            tables=[(self.users, _READ_WRITE), (self.creds, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-            create_queue=True,
-        )
-        POST_users.lambda_function.add_environment("domain_name", self.domain_name)
-        POST_users.lambda_function.add_environment(
-            "hosted_zone_id", self.hosted_zone.hosted_zone_id
-        )
-        POST_users.lambda_function.role.add_managed_policy(
-            iam.ManagedPolicy.from_aws_managed_policy_name(_ACM_FULL_PERMISSION_POLICY)
-        )
-        OPTIONS_users = self.add(
-            "/users",
-            "OPTIONS",
-            "users",
-            filename_overwrite="users_OPTIONS",
-        )
-
-        # sign-in
-        POST_signin = self.add(
-            "/sign-in",
-            "POST",
-            "sign-in",
-            filename_overwrite="signin_POST",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ_WRITE),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        OPTIONS_signin = self.add(
-            "/sign-in",
-            "OPTIONS",
-            "sign-in",
-            filename_overwrite="signin_OPTIONS",
-        )
-        # sessions
-        POST_sessions = self.add(
-            "/sessions",
-            "POST",
-            "sessions",
-            filename_overwrite="sessions_POST",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ_WRITE),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        OPTIONS_sessions = self.add(
-            "/sessions",
-            "OPTIONS",
-            "sessions",
-            filename_overwrite="sessions_OPTIONS",
-        )
-
-        # apikeys
-        GET_list_of_api_keys = self.add(
-            "/api-keys",
-            "GET",
-            "api-keys",
-            filename_overwrite="api_keys_list_GET",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        POST_api_keys = self.add(
-            "/api-keys",
-            "POST",
-            "api-keys",
-            filename_overwrite="api_keys_POST",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        DELETE_api_keys = self.add(
-            "/api-keys/{api_key}",
-            "DELETE",
-            "api-keys",
-            filename_overwrite="api_keys_DELETE",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        OPTIONS_api_keys_proxy = self.add(
-            "/api-keys/{api_key}",
-            "OPTIONS",
-            "api-keys",
-            filename_overwrite="api_keys_proxy_OPTIONS",
-        )
-
-        OPTIONS_api_keys = self.add(
-            "/api-keys",
-            "OPTIONS",
-            "api-keys",
-            filename_overwrite="api_keys_OPTIONS",
-        )
-
-        # credentials
-        # Note: need read-write permission for GET due to use of PartiQL
-        OPTIONS_credentials = self.add(
-            "/credentials",
-            "OPTIONS",
-            "credentials",
-            filename_overwrite="credentials_OPTIONS",
-        )
-        OPTIONS_proxy_credentials = self.add(
-            "/credentials/{credential_name}",
-            "OPTIONS",
-            "credentials",
-            filename_overwrite="credentials_proxy_OPTIONS",
-        )
-        GET_creds = self.add(
-            "/credentials",
-            "GET",
-            "credentials",
-            filename_overwrite="credentials_GET",
-            tables=[(self.users, _READ), (self.creds, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        POST_access_creds = self.add(
-            "/credentials",
-            "POST",
-            "credentials",
-            filename_overwrite="credentials_POST",
-            tables=[(self.users, _READ), (self.creds, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        DELETE_access_creds = self.add(
-            "/credentials/{credential_name}",
-            "DELETE",
-            "credentials",
-            filename_overwrite="credentials_DELETE",
-            tables=[(self.users, _READ), (self.creds, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        # ml-models
-        OPTIONS_ml_models = self.add(
-            "/ml-models",
-            "OPTIONS",
-            "ml-models",
-            filename_overwrite="ml_models_OPTIONS",
-        )
-        OPTIONS_ml_models_proxy = self.add(
-            "/ml-models/{model_name}",
-            "OPTIONS",
-            "ml-models",
-            filename_overwrite="ml_models_proxy_OPTIONS",
-        )
-        DELETE_ml_models = self.add(
-            "/ml-models/{model_name}",
-            "DELETE",
-            "ml-models",
-            filename_overwrite="ml_models_DELETE",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        self.models_bucket.grant_read_write(DELETE_ml_models.lambda_function)
-        for policy in [_IAM_FULL_PERMISSION_POLICY, _APIGW_FULL_PERMISSION_POLICY]:
-            DELETE_ml_models.lambda_function.role.add_managed_policy(
-                iam.ManagedPolicy.from_aws_managed_policy_name(policy)
-            )
-
-        PUT_ml_models = self.add(
-            "/ml-models/{model_name}",
-            "PUT",
-            "ml-models",
-            filename_overwrite="ml_models_PUT",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            buckets=[(self.staging_bucket, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        PUT_ml_models.lambda_function.role.add_managed_policy(
-            iam.ManagedPolicy.from_aws_managed_policy_name(
-                _APIGW_FULL_PERMISSION_POLICY
-            )
-        )
-
-        POST_ml_models = self.add(
-            "/ml-models/{model_name}",
-            "POST",
-            "ml-models",
-            filename_overwrite="ml_models_POST",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            buckets=[(self.staging_bucket, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        POST_ml_models.lambda_function.role.add_managed_policy(
-            iam.ManagedPolicy.from_aws_managed_policy_name(
-                _APIGW_FULL_PERMISSION_POLICY
-            )
-        )
-
-        GET_ml_models = self.add(
-            "/ml-models/{model_name}",
-            "GET",
-            "ml-models",
-            filename_overwrite="ml_models_GET",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ_WRITE),
-                (self.models, _READ_WRITE),
-            ],
-            buckets=[(self.models_bucket, _READ)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        GET_list_of_ml_models = self.add(
-            "/ml-models",
-            "GET",
-            "ml-models",
-            filename_overwrite="ml_models_list_GET",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ),
-                (self.models, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        # # ml-models preprocessing function
-        # OPTIONS_preprocessing = self.add(
-        #     "/ml-models/{model_name}/preprocessing",
-        #     "OPTIONS",
-        #     "preprocessing",
-        #     filename_overwrite="preprocessing_OPTIONS",
-        # )
-        # DELETE_preprocessing = self.add(
-        #     "/ml-models/{model_name}/preprocessing",
-        #     "DELETE",
-        #     "preprocessing",
-        #     filename_overwrite="preprocessing_DELETE",
-        #     tables=[
-        #         (self.users, _READ),
-        #         (self.creds, _READ),
-        #         (self.models, _READ_WRITE),
-        #     ],
-        #     secrets=[("jwt_secret", self.jwt_secret)],
-        #     layers=[self.py_jwt_layer],
-        # )
-        # self.models_bucket.grant_read_write(DELETE_preprocessing.lambda_function)
-        # for policy in [_IAM_FULL_PERMISSION_POLICY, _APIGW_FULL_PERMISSION_POLICY]:
-        #     DELETE_preprocessing.lambda_function.role.add_managed_policy(
-        #         iam.ManagedPolicy.from_aws_managed_policy_name(policy)
-        #     )
-
-        # PUT_preprocessing = self.add(
-        #     "/ml-models/{model_name}/preprocessing",
-        #     "PUT",
-        #     "preprocessing",
-        #     filename_overwrite="preprocessing_PUT",
-        #     tables=[
-        #         (self.users, _READ),
-        #         (self.creds, _READ),
-        #         (self.models, _READ_WRITE),
-        #     ],
-        #     buckets=[(self.staging_bucket, _READ_WRITE)],
-        #     secrets=[("jwt_secret", self.jwt_secret)],
-        #     layers=[self.py_jwt_layer],
-        # )
-        # PUT_preprocessing.lambda_function.role.add_managed_policy(
-        #     iam.ManagedPolicy.from_aws_managed_policy_name(
-        #         _APIGW_FULL_PERMISSION_POLICY
-        #     )
-        # )
-
-        # POST_preprocessing = self.add(
-        #     "/ml-models/{model_name}/preprocessing",
-        #     "POST",
-        #     "preprocessing",
-        #     filename_overwrite="preprocessing_POST",
-        #     tables=[
-        #         (self.users, _READ),
-        #         (self.creds, _READ),
-        #         (self.models, _READ_WRITE),
-        #     ],
-        #     buckets=[(self.staging_bucket, _READ_WRITE)],
-        #     secrets=[("jwt_secret", self.jwt_secret)],
-        #     layers=[self.py_jwt_layer],
-        # )
-        # POST_preprocessing.lambda_function.role.add_managed_policy(
-        #     iam.ManagedPolicy.from_aws_managed_policy_name(
-        #         _APIGW_FULL_PERMISSION_POLICY
-        #     )
-        # )
-
-        # GET_preprocessing = self.add(
-        #     "/ml-models/{model_name}/preprocessing",
-        #     "GET",
-        #     "preprocessing",
-        #     filename_overwrite="preprocessing_GET",
-        #     tables=[
-        #         (self.users, _READ),
-        #         (self.creds, _READ),
-        #         (self.usages, _READ_WRITE),
-        #         (self.models, _READ_WRITE),
-        #     ],
-        #     buckets=[(self.models_bucket, _READ)],
-        #     secrets=[("jwt_secret", self.jwt_secret)],
-        #     layers=[self.py_jwt_layer],
-        # )
-
-        # ml-models - logs
-        OPTIONS_ml_models_logs = self.add(
-            "/ml-models/{model_name}/logs",
-            "OPTIONS",
-            "ml-models-logs",
-            filename_overwrite="ml_models_logs_OPTIONS",
-        )
-        OPTIONS_ml_models_logs_proxy = self.add(
-            "/ml-models/{model_name}/logs/{log_timestamp}",
-            "OPTIONS",
-            "ml-models-logs-timestamp",
-            filename_overwrite="ml_models_logs_proxy_OPTIONS",
+            domain_name=f"{subdomain}.{self.domain_name}",
         )
-        GET_list_of_ml_models_logs = self.add(
-            "/ml-models/{model_name}/logs",
-            "GET",
-            "ml-models-logs",
-            filename_overwrite="ml_models_logs_list_GET",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ_WRITE),
-            ],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-        GET_ml_models_logs = self.add(
-            "/ml-models/{model_name}/logs/{log_timestamp}",
-            "GET",
-            "ml-models-logs",
-            filename_overwrite="ml_models_logs_GET",
-            tables=[
-                (self.users, _READ),
-                (self.creds, _READ),
-                (self.usages, _READ_WRITE),
-            ],
-            buckets=[(self.logs_bucket, _READ_WRITE)],
-            secrets=[("jwt_secret", self.jwt_secret)],
-            layers=[self.py_jwt_layer],
-        )
-
-        # DNS records
         target = route53.CfnRecordSet.AliasTargetProperty(
             dns_name=domain_name.domain_name_alias_domain_name,
             hosted_zone_id=domain_name.domain_name_alias_hosted_zone_id,
             evaluate_target_health=False,
         )
-
-        self.api_record = route53.CfnRecordSet(
+        route53.CfnRecordSet(
             self,
-            "UserApiARecord",
-            name=f"{_USER_API}.{self.domain_name}",
+            record_id,
+            name=f"{subdomain}.{self.domain_name}",
             type="A",
             alias_target=target,
             hosted_zone_id=self.hosted_zone.hosted_zone_id,
             region=self.region_name,
             set_identifier=f"user-{cdk.Aws.STACK_NAME}",
         )
+        return domain_name
+
+    def setup_domains(self):
+        """Create the custom domains (and their A records) of both APIs."""
+        self.user_api_domain = self.create_api_domain(
+            f"{self.domain_name}_domain_name", "UserApiARecord", _USER_API
+        )
+        self.proxy_api_domain = self.create_api_domain(
+            f"{self.domain_name}_api_domain_name", "ProxyApiARecord", "api"
+        )
+
+    def route_environment(self, *specs: RouteSpec) -> Dict[str, str]:
+        return {
+            key: attrgetter(attribute)(self)
+            for spec in specs
+            for key, attribute in spec.environment
+        }
 
-        return (
-            api,
-            {
-                "POST_signup": POST_users,
-                "POST_signin": POST_sessions,
-                "GET_creds": GET_creds,
-                "PUT_ml_models": PUT_ml_models,
-                "DELETE_ml_models": DELETE_ml_models,
-                "GET_ml_models": GET_ml_models,
-                "GET_list_of_ml_models": GET_list_of_ml_models,
+    def create_dispatch_lambda(
+        self, id: str, specs: List[RouteSpec]
+    ) -> lambda_.IFunction:
+        """Create one lambda serving all of `specs` through src/dispatch.py."""
+        _lambda = self.create_lambda(
+            id,
+            tables=[(getattr(self, t), p) for spec in specs for t, p in spec.tables],
+            buckets=[(getattr(self, b), p) for spec in specs for b, p in spec.buckets],
+            layers=[self.py_jwt_layer],
+            handler="dispatch.handler",
+            extra_env={
+                "jwt_secret": self.jwt_secret.secret_name,
+                "routes": json.dumps(
+                    {f"{spec.http_method} {spec.path}": spec.filename for spec in specs}
+                ),
+                **self.route_environment(*specs),
             },
+            memory_size=max(spec.memory_size for spec in specs),
         )
+        return _lambda
 
-    def create_new_user_lambda(self) -> lambda_.Function:
-        new_user_lambda = lambda_.Function(
+    def create_api_gateway_and_lambdas(
+        self,
+    ) -> Tuple[apigw.RestApi, Dict[str, LambdaQueueTuple]]:
+        # create resources
+        api = apigw.RestApi(
             self,
-            "new_user_lambda",
-            function_name=f"{self.prefix}_new_user",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
-            handler="new_user.handler",
-            timeout=Duration.seconds(300),
-            environment={
-                "hosted_zone_id": self.hosted_zone.hosted_zone_id,
-                "region_name": self.region_name,
-                "queue": self.POST_signup.queue.queue_url,
-            },
-            layers=[],
-            reserved_concurrent_executions=2,
+            id=f"{self.prefix}_api",
+            endpoint_types=[apigw.EndpointType.REGIONAL],
         )
-        add_tags(new_user_lambda, {"lambda": "new_user_lambda"})
-        self.POST_signup.queue.grant_consume_messages(new_user_lambda)
-        self.POST_signup.queue.grant_send_messages(new_user_lambda)
-        new_user_lambda.add_event_source(
-            event_sources.SqsEventSource(self.POST_signup.queue, batch_size=1)
+        add_tags(api, {"api": f"{self.prefix}_api"})
+
+        self.resources = RouteResource(
+            resource=api.root,
+            paths=[spec.path for spec in _ROUTES] + list(_CORS_PREFLIGHTS),
         )
-        permissions = [
-            _ACM_FULL_PERMISSION_POLICY,
-            _SQS_FULL_PERMISSION_POLICY,
-            _ROUTE_53_FULL_PERMISSION_POLICY,
-            _APIGW_FULL_PERMISSION_POLICY,
-        ]
-        for permission in permissions:
-            new_user_lambda.role.add_managed_policy(
-                iam.ManagedPolicy.from_aws_managed_policy_name(permission)
-            )
 
-        return new_user_lambda
+        # serve it from the custom domain
+        self.user_api_domain.add_base_path_mapping(api)
 
-    def create_delete_user_lambda(self) -> lambda_.Function:
-        delete_queue = sqs.Queue(
-            self,
-            "delete_queue",
-            visibility_timeout=Duration.minutes(15),
-            retention_period=Duration.hours(12),
-            fifo=True,
-            content_based_deduplication=False,
-            deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
-        )
-        delete_user_lambda = lambda_.Function(
+        shared: Dict[str, List[RouteSpec]] = {}
+        for spec in _ROUTES:
+            if spec.function:
+                shared.setdefault(spec.function, []).append(spec)
+        functions = {
+            id: self.create_dispatch_lambda(id, specs) for id, specs in shared.items()
+        }
+
+        routes: Dict[str, LambdaQueueTuple] = {}
+        for spec in _ROUTES:
+            route = self.add(
+                spec.path,
+                spec.http_method,
+                spec.resource_name,
+                filename_overwrite=spec.filename,
+                tables=[(getattr(self, t), p) for t, p in spec.tables],
+                buckets=[(getattr(self, b), p) for b, p in spec.buckets],
+                secrets=[("jwt_secret", self.jwt_secret)],
+                layers=[self.py_jwt_layer],
+                create_queue=spec.create_queue,
+                extra_env=self.route_environment(spec),
+                memory_size=spec.memory_size,
+                provisioned=spec.provisioned,
+                reuse=functions.get(spec.function),
+            )
+            _lambda = route.lambda_function
+            for policy in spec.policies:
+                _lambda.role.add_managed_policy(getattr(self, policy))
+            for policy in spec.managed_policies:
+                _lambda.role.add_managed_policy(self.managed_policy(policy))
+            if spec.name:
+                routes[spec.name] = route
+
+        for path, (methods, headers) in _CORS_PREFLIGHTS.items():
+            self.add_cors_preflight(path, methods=methods, additional_headers=headers)
+
+        return api, routes
+
+    def create_user_lifecycle_statements(self) -> List[iam.PolicyStatement]:
+        """Return the permissions src/flows needs to create/delete a user's API."""
+        apigw_arn = f"arn:{cdk.Aws.PARTITION}:apigateway:{self.region_name}::"
+        return [
+            iam.PolicyStatement(
+                actions=["acm:RequestCertificate"],
+                resources=["*"],
+            ),
+            iam.PolicyStatement(
+                actions=["acm:DescribeCertificate", "acm:DeleteCertificate"],
+                resources=[
+                    f"arn:{cdk.Aws.PARTITION}:acm:{self.region_name}:{self.account}"
+                    ":certificate/*"
+                ],
+            ),
+            iam.PolicyStatement(
+                actions=["route53:ChangeResourceRecordSets"],
+                resources=[self.hosted_zone.hosted_zone_arn],
+            ),
+            iam.PolicyStatement(
+                actions=[
+                    "apigateway:GET",
+                    "apigateway:POST",
+                    "apigateway:PUT",
+                    "apigateway:DELETE",
+                ],
+                resources=[
+                    f"{apigw_arn}/restapis",
+                    f"{apigw_arn}/restapis/*",
+                    f"{apigw_arn}/domainnames",
+                    f"{apigw_arn}/domainnames/*",
+                    f"{apigw_arn}/tags/*",
+                ],
+            ),
+        ]
+
+    def create_user_lifecycle_lambda(
+        self, name: str, queue: sqs.Queue, event_source: bool = False
+    ) -> lambda_.Function:
+        _lambda = lambda_.Function(
             self,
-            "delete_user_lambda",
-            function_name=f"{self.prefix}_delete_user",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
-            handler="delete_user.handler",
+            f"{name}_lambda",
+            function_name=f"{self.prefix}_{name}",
+            runtime=_PYTHON_RUNTIME,
+            architecture=_ARM_64,
+            code=self.src_code,
+            handler=f"{name}.handler",
             timeout=Duration.seconds(300),
+            memory_size=_DEFAULT_MEMORY_SIZE,
             environment={
                 "hosted_zone_id": self.hosted_zone.hosted_zone_id,
                 "region_name": self.region_name,
-                "queue": delete_queue.queue_url,
+                "queue": queue.queue_url,
             },
-            layers=[],
+            layers=[self.common_layer],
             reserved_concurrent_executions=2,
         )
-        delete_queue.grant_send_messages(delete_user_lambda)
-        delete_queue.grant_consume_messages(delete_user_lambda)
-        permissions = [
-            _ACM_FULL_PERMISSION_POLICY,
-            _SQS_FULL_PERMISSION_POLICY,
-            _ROUTE_53_FULL_PERMISSION_POLICY,
-            _APIGW_FULL_PERMISSION_POLICY,
-        ]
-        for permission in permissions:
-            delete_user_lambda.role.add_managed_policy(
-                iam.ManagedPolicy.from_aws_managed_policy_name(permission)
+        add_tags(_lambda, {"lambda": f"{name}_lambda"})
+        queue.grant_consume_messages(_lambda)
+        queue.grant_send_messages(_lambda)
+        if event_source:
+            # one message at a time: creating a user's API can take most of
+            # the 300 s timeout (certificate validation), so the rest of a
+            # larger batch would just sit out the visibility timeout
+            _lambda.add_event_source(
+                event_sources.SqsEventSource(
+                    queue, batch_size=1, report_batch_item_failures=True
+                )
             )
+        for statement in self.user_lifecycle_statements:
+            _lambda.add_to_role_policy(statement)
 
-        return delete_user_lambda
+        return _lambda
 
     def create_proxy_lambda(self) -> Tuple[lambda_.Alias, LambdaQueueTuple]:
         execution_lambda = lambda_.DockerImageFunction(
@@ -833,7 +902,7 @@ class MainStack(Stack):
             version=execution_version,
             provisioned_concurrent_executions=0,  # 1 if self.env_ == "prod" else 0,
         )
-        self.models_bucket.grant_read_write(execution_alias)
+        execution_lambda.role.add_managed_policy(self.models_read_write_policy)
 
         pandas_layer = lambda_.LayerVersion.from_layer_version_arn(
             self,
@@ -844,8 +913,8 @@ class MainStack(Stack):
             self,
             "preprocessing_lambda",
             function_name=f"{self.prefix}_preprocessing",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
+            runtime=_PYTHON_RUNTIME,
+            code=self.src_code,
             handler="preprocessing.handler",
             vpc=self.vpc,
             vpc_subnets=ec2.SubnetSelection(subnets=self.subnets.subnets),
@@ -856,7 +925,7 @@ class MainStack(Stack):
                 "prefix": self.prefix,
             },
             security_groups=[self.sg],
-            layers=[pandas_layer],
+            layers=[self.common_layer, pandas_layer],
         )
         add_tags(preprocessing_lambda, {"lambda": "preprocessing"})
 
@@ -864,8 +933,9 @@ class MainStack(Stack):
             self,
             "proxy_lambda",
             function_name=f"{self.prefix}_proxy",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
+            runtime=_PYTHON_RUNTIME,
+            architecture=_ARM_64,
+            code=self.src_code,
             handler="proxy.handler",
             vpc=self.vpc,
             vpc_subnets=ec2.SubnetSelection(subnets=self.subnets.subnets),
@@ -876,30 +946,23 @@ class MainStack(Stack):
                 "preprocessing_lambda": preprocessing_lambda.function_arn,
                 "prefix": self.prefix,
             },
+            layers=[self.common_layer],
             security_groups=[self.sg],
         )
         add_tags(proxy_lambda, {"lambda": "proxy"})
         execution_alias.grant_invoke(proxy_lambda)
         preprocessing_lambda.grant_invoke(proxy_lambda)
-        self.models.grant_full_access(proxy_lambda)
+        grant_table(self.models, _READ_WRITE, proxy_lambda)
 
-        logs_queue = sqs.Queue(
-            self,
-            "logs_queue",
-            visibility_timeout=Duration.minutes(15),
-            retention_period=Duration.hours(12),
-            fifo=True,
-            content_based_deduplication=False,
-            deduplication_scope=sqs.DeduplicationScope.MESSAGE_GROUP,
-        )
+        logs_queue = self.create_fifo_queue("logs_queue")
 
         # S3 permission
         self.models_bucket.grant_read(proxy_lambda)
         self.logs_bucket.grant_read_write(proxy_lambda)
 
         # DynamoDB permission
-        self.usages.grant_full_access(proxy_lambda)
-        proxy_lambda.add_environment(self.usages.table_name, self.usages.table_arn)
+        grant_table(self.usages, _READ_WRITE, proxy_lambda)
+        proxy_lambda.add_environment(*self._table_meta[self.usages])
 
         # SQS queue permission
         logs_queue.grant_send_messages(proxy_lambda)
@@ -920,31 +983,7 @@ class MainStack(Stack):
         model_name.add_method("POST")  # POST /{username}/{model_name}
 
         # Domain name
-        domain_name = apigw.DomainName(
-            self,
-            f"{self.domain_name}_api_domain_name",
-            mapping=proxy_api,
-            certificate=self.main_cert,
-            domain_name=f"api.{self.domain_name}",
-        )
-
-        # DNS records
-        target = route53.CfnRecordSet.AliasTargetProperty(
-            dns_name=domain_name.domain_name_alias_domain_name,
-            hosted_zone_id=domain_name.domain_name_alias_hosted_zone_id,
-            evaluate_target_health=False,
-        )
-
-        self.api_record = route53.CfnRecordSet(
-            self,
-            "ProxyApiARecord",
-            name=f"api.{self.domain_name}",
-            type="A",
-            alias_target=target,
-            hosted_zone_id=self.hosted_zone.hosted_zone_id,
-            region=self.region_name,
-            set_identifier=f"user-{cdk.Aws.STACK_NAME}",
-        )
+        self.proxy_api_domain.add_base_path_mapping(proxy_api)
         add_tags(proxy_api, {"route53": self.domain_name})
 
         return execution_alias, LambdaQueueTuple(proxy_lambda, logs_queue)
@@ -972,17 +1011,19 @@ class MainStack(Stack):
             self,
             "staging_trigger",
             function_name=f"{self.prefix}-staging-trigger",
-            runtime=lambda_.Runtime.PYTHON_3_10,
-            code=lambda_.Code.from_asset("src"),
+            runtime=_PYTHON_RUNTIME,
+            architecture=_ARM_64,
+            code=self.src_code,
             handler="s3_staging_trigger.handler",
             environment={
                 "prefix": self.prefix,
             },
-            timeout=Duration.seconds(29),
+            timeout=_API_LAMBDA_TIMEOUT,
+            layers=[self.common_layer],
         )
         self.staging_bucket.grant_read_write(staging_trigger)
-        self.models_bucket.grant_read_write(staging_trigger)
-        self.models.grant_full_access(staging_trigger)
+        staging_trigger.role.add_managed_policy(self.models_read_write_policy)
+        grant_table(self.models, _READ_WRITE, staging_trigger)
 
         staging_trigger.add_event_source(self.staging_s3_trigger)
 
@@ -998,6 +1039,22 @@ class MainStack(Stack):
             enforce_ssl=True,
             versioned=True,
             removal_policy=RemovalPolicy.RETAIN,
+            # the staging trigger tags objects it has moved to the models bucket
+            # (see src/s3_staging_trigger.py)
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    id="expire_staged",
+                    tag_filters={"staged": "done"},
+                    expiration=Duration.days(1),
+                    noncurrent_version_expiration=Duration.days(1),
+                ),
+                # expiring a version only adds a delete marker; remove them
+                # once the versions behind them are gone (this can't be
+                # combined with a tag filter)
+                s3.LifecycleRule(
+                    id="remove_delete_markers", expired_object_delete_marker=True
+                ),
+            ],
         )
 
         self.staging_s3_trigger = event_sources.S3EventSource(
@@ -1010,12 +1067,14 @@ class MainStack(Stack):
         construct_id: str,
         prefix: str,
         domain_name: str,
+        hosted_zone_id: str,
         region_name: str,
         other_regions: List[str],
         account_number: str,
         buckets: Dict[str, s3.Bucket],
         vpc: ec2.Vpc,
         env_: str,
+        lambda_image_digest: str,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -1025,9 +1084,41 @@ class MainStack(Stack):
         self.prefix = prefix
         self.region_name = region_name
         self.domain_name = domain_name
+        self._managed_policies: Dict[str, iam.IManagedPolicy] = {}
+        self._tables: Dict[str, dynamodb.ITable] = {}
+        self._table_meta: Dict[dynamodb.ITable, Tuple[str, str]] = {}
+        self._integrations: Dict[lambda_.IFunction, apigw.LambdaIntegration] = {}
+
+        # every python lambda is deployed from the same asset, with the shared
+        # `helpers` package published once as a layer
+        self.src_code = lambda_.Code.from_asset("src", exclude=_ASSET_EXCLUDES)
+        self.common_layer = lambda_.LayerVersion(
+            self,
+            "common_layer",
+            code=lambda_.Code.from_asset("layers/common", exclude=_ASSET_EXCLUDES),
+            compatible_runtimes=[_PYTHON_RUNTIME],
+            compatible_architectures=[_ARM_64, _X86_64],
+        )
 
         self.models_bucket = buckets["models_bucket"]
         self.logs_bucket = buckets["logs_bucket"]
+
+        # shared by every role that reads and writes models, instead of one
+        # `grant_read_write` statement per role
+        self.models_read_write_policy = iam.ManagedPolicy(
+            self,
+            "models_read_write_policy",
+            statements=[
+                iam.PolicyStatement(
+                    actions=_BUCKET_READ_WRITE_ACTIONS,
+                    resources=[
+                        self.models_bucket.bucket_arn,
+                        self.models_bucket.arn_for_objects("*"),
+                    ],
+                )
+            ],
+        )
+
         self.create_staging_bucket()
 
         self.vpc = vpc
@@ -1041,20 +1132,12 @@ class MainStack(Stack):
         self.import_databases()
 
         # DNS
-        self.hosted_zone = self.import_hosted_zone()
+        self.hosted_zone = self.import_hosted_zone(hosted_zone_id)
         self.main_cert = self.create_cert_for_domain()
+        self.setup_domains()
 
         # ECR
-        repo_name = "lambda_runtime" if self.env_ == "dev" else "neuro"
-        ecr = boto3.Session(
-            profile_name="dev",
-            region_name=self.region_name,
-        ).client("ecr")
-        self.lambda_image_digest = next(
-            image["imageDigest"]
-            for image in ecr.list_images(repositoryName=repo_name)["imageIds"]
-            if image.get("imageTag", "") == "latest"
-        )
+        self.lambda_image_digest = lambda_image_digest
 
         # security group for proxy lambda & execution lambda
         self.sg = self.create_security_group()
@@ -1073,8 +1156,13 @@ class MainStack(Stack):
         self.DELETE_ml_models = rest["DELETE_ml_models"]
 
         # Additional lambdas
-        self.new_user_lambda = self.create_new_user_lambda()
-        self.delete_user_lambda = self.create_delete_user_lambda()
+        self.user_lifecycle_statements = self.create_user_lifecycle_statements()
+        self.new_user_lambda = self.create_user_lifecycle_lambda(
+            "new_user", self.POST_signup.queue, event_source=True
+        )
+        self.delete_user_lambda = self.create_user_lifecycle_lambda(
+            "delete_user", self.create_fifo_queue("delete_queue")
+        )
 
         # Trigger lambda when new file is uploaded to staging bucket
         self.staging_trigger = self.create_s3_staging_trigger()
@@ -1099,7 +1187,7 @@ class MainStack(Stack):
             event_sources.SqsEventSource(self.regional_queue)
         )
         self.staging_trigger.role.add_managed_policy(
-            iam.ManagedPolicy.from_aws_managed_policy_name(_SNS_FULL_PERMISSION_POLICY)
+            self.managed_policy(_SNS_FULL_PERMISSION_POLICY)
         )
         # record arn of other regions' SNS topic as enviornment variable
         self.staging_trigger.add_environment("topic_arn", self.regional_topic.topic_arn)
@@ -0,0 +1,12 @@
+import os
+import json
+from importlib import import_module
+
+# "<http method> <resource>" -> handler module, e.g. "GET /api-keys" -> "api_keys_list_GET"
+_ROUTES: dict[str, str] = json.loads(os.environ["routes"])
+
+
+def handler(event: dict, context):
+    """Forward an API Gateway event to the handler module of its route."""
+    module = import_module(_ROUTES[f"{event['httpMethod']} {event['resource']}"])
+    return module.handler(event, context)
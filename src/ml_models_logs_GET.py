@@ -16,8 +16,8 @@ s3 = boto3.client("s3")
 
 
 def get_link(object_name: str, expiration: int = 60) -> str:
-    # check if object exists
-    _ = s3.get_object(Bucket=LOGS_BUCKET_NAME, Key=object_name)
+    # check if object exists (HEAD, so no body is left open on the connection)
+    _ = s3.head_object(Bucket=LOGS_BUCKET_NAME, Key=object_name)
 
     return s3.generate_presigned_url(
         "get_object",
@@ -1,6 +1,5 @@
 import os
 import json
-from uuid import uuid4 as uuid
 from flows.new_user_api import create_api_for_sub_domain
 
 import boto3
@@ -31,19 +30,31 @@ def handler(event: dict, context):
         _ = sqs.send_message(
             QueueUrl=_QUEUE,
             MessageGroupId=record["username"],
-            MessageDeduplicationId=str(uuid()),
             MessageBody=json.dumps(record),
         )
         print("Sent")
         return
 
-    for record in event["Records"]:
-        body = json.loads(record["body"])
-        valid, record = grab_fields(body)
-        if not valid:
-            raise Exception(
-                "Missing one or more of the following fields from SQS message: username, domain_name"
-            )
-
-        api = create_api_for_sub_domain(**record)
-        print("Created api: ", json.dumps(api, default=str))
+    # report unprocessed messages back to SQS so only they are retried
+    failures = []
+    for message in event["Records"]:
+        # FIFO queue: once a message fails, retry every message after it as well
+        if failures:
+            failures.append({"itemIdentifier": message["messageId"]})
+            continue
+
+        try:
+            body = json.loads(message["body"])
+            valid, record = grab_fields(body)
+            if not valid:
+                raise Exception(
+                    "Missing one or more of the following fields from SQS message: username, domain_name"
+                )
+
+            api = create_api_for_sub_domain(**record)
+            print("Created api: ", json.dumps(api, default=str))
+        except Exception as err:
+            print(f"Failed to process message {message['messageId']}: {err}")
+            failures.append({"itemIdentifier": message["messageId"]})
+
+    return {"batchItemFailures": failures}
@@ -1,30 +1,126 @@
 import os
 from datetime import datetime
 import json
-from collections import namedtuple
+import logging
+import re
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from helpers import dynamodb as ddb
 from helpers.logging import logger
 
-s3_tuple = namedtuple("s3_tuple", ["bucket", "key"])
 
-s3 = boto3.client("s3")
-s3r = boto3.resource("s3")
+@dataclass(frozen=True, slots=True)
+class S3Ref:
+    bucket: str
+    key: str
+    # the staged version an event is about; None means the current one
+    version_id: str | None = None
+
+    def versioned(self) -> dict:
+        return {"VersionId": self.version_id} if self.version_id else {}
+
+
+# shared by both clients; the pool has room for every executor worker
+_CONFIG = Config(
+    max_pool_connections=50,
+    retries={"mode": "adaptive", "max_attempts": 5},
+    tcp_keepalive=True,
+)
+
+
+# the session and clients are built on first use rather than at import
+@lru_cache(maxsize=None)
+def _session() -> boto3.session.Session:
+    return boto3.session.Session()
+
+
+@lru_cache(maxsize=None)
+def _s3():
+    return _session().client("s3", config=_CONFIG)
+
+
+@lru_cache(maxsize=None)
+def _dynamodb():
+    # clients (unlike resources) are safe to share between threads
+    return _session().client("dynamodb", config=_CONFIG)
+
 
 _PREFIX = os.environ["prefix"]
 
+# staged objects are tagged once moved, and the staging bucket's lifecycle
+# rule expires them (see MainStack.create_staging_bucket)
+_STAGED_TAG = {"Key": "staged", "Value": "done"}
+
+_MOPS = {"model", "preprocessing"}
+# model names are validated to these characters when the upload is requested
+_MODEL_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+# records are independent, I/O bound work, so process them concurrently
+_EXECUTOR = ThreadPoolExecutor(max_workers=16)
+
 
 # dynamodb boto3
 MODELS_TABLE_NAME = f"{_PREFIX}_Models"
-dynamodb_client = boto3.client("dynamodb")
-dynamodb = boto3.resource("dynamodb")
-MODELS_TABLE = dynamodb.Table(MODELS_TABLE_NAME)
 
 
-def get_model(username: str, model_name: str) -> dict:
-    statement = f"SELECT * FROM {MODELS_TABLE_NAME} WHERE pk='username|{username}' AND sk='{model_name}';"
-    response = dynamodb_client.execute_statement(Statement=statement)
-    return ddb.from_(response.get("Items", [{}])[0])
+class InvalidEventError(Exception):
+    """The staged object's metadata doesn't describe a model upload."""
+
+
+@lru_cache(maxsize=8)
+def models_bucket(region_name: str) -> str:
+    return f"{_PREFIX}-models-{region_name}"
+
+
+def upload_id(event: dict) -> str:
+    # identifies the upload an event is about (not its content), so that
+    # re-uploading the same file is still processed; the staging bucket is
+    # versioned, the sequencer is only a fallback
+    s3_object = event["s3"]["object"]
+    return s3_object.get("versionId") or f"{s3_object['key']}|{s3_object['sequencer']}"
+
+
+def claim_upload(username: str, model_name: str, for_model: bool, upload: str) -> bool:
+    # record upload as the model's latest one, unless it already is: S3 can
+    # deliver the same event more than once, and only the first delivery of
+    # an upload gets to copy it. Also fails if the model record is missing.
+    try:
+        _dynamodb().update_item(
+            TableName=MODELS_TABLE_NAME,
+            Key=ddb.to_({"pk": f"username|{username}", "sk": model_name}),
+            UpdateExpression="SET #e = :e",
+            ConditionExpression=(
+                "attribute_exists(pk) AND (attribute_not_exists(#e) OR #e <> :e)"
+            ),
+            ExpressionAttributeNames={"#e": upload_attribute(for_model)},
+            ExpressionAttributeValues=ddb.to_({":e": upload}),
+        )
+    except _dynamodb().exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def release_upload(username: str, model_name: str, for_model: bool, upload: str):
+    # undo claim_upload, unless a later upload has been claimed since
+    try:
+        _dynamodb().update_item(
+            TableName=MODELS_TABLE_NAME,
+            Key=ddb.to_({"pk": f"username|{username}", "sk": model_name}),
+            UpdateExpression="REMOVE #e",
+            ConditionExpression="#e = :e",
+            ExpressionAttributeNames={"#e": upload_attribute(for_model)},
+            ExpressionAttributeValues=ddb.to_({":e": upload}),
+        )
+    except _dynamodb().exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def upload_attribute(for_model: bool) -> str:
+    return "upload_version" if for_model else "preprocessing_upload_version"
 
 
 def upsert_ml_model_record(
@@ -33,76 +129,167 @@ def upsert_ml_model_record(
     for_model: bool,
     bucket: str,
     key: str,
+    updated_at: str,
 ):
-    record = get_model(username=username, model_name=model_name)
-    record.update(
-        {
-            "updated_at": datetime.utcnow().isoformat(),
-            "bucket": bucket,
-            "key": key,
-        }
+    # update the attributes in place rather than reading and re-putting the
+    # whole record; the model record itself must already exist
+    _dynamodb().update_item(
+        TableName=MODELS_TABLE_NAME,
+        Key=ddb.to_({"pk": f"username|{username}", "sk": model_name}),
+        UpdateExpression="SET updated_at = :u, #b = :b, #k = :k, #flag = :t",
+        ConditionExpression="attribute_exists(pk)",
+        ExpressionAttributeNames={
+            "#b": "bucket",
+            "#k": "key",
+            "#flag": "is_uploaded" if for_model else "is_preprocessing_uploaded",
+        },
+        ExpressionAttributeValues=ddb.to_(
+            {
+                ":u": updated_at,
+                ":b": bucket,
+                ":k": key,
+                ":t": True,
+            }
+        ),
     )
-    record["is_uploaded" if for_model else "is_preprocessing_uploaded"] = True
-    MODELS_TABLE.put_item(Item=record)
 
 
-def get_attributes(bucket_name: str, object_name: str) -> dict:
+def get_attributes(
+    bucket_name: str, object_name: str, version_id: str | None = None
+) -> dict:
+    # HEAD returns the user metadata without downloading the object
+    versioned = {"VersionId": version_id} if version_id else {}
     try:
-        response = s3.get_object(Bucket=bucket_name, Key=object_name)
-    except s3.exceptions.NoSuchKey:
-        raise Exception("The resource you requested does not exist.")
+        response = _s3().head_object(Bucket=bucket_name, Key=object_name, **versioned)
+    except ClientError as err:
+        if err.response["Error"]["Code"] == "404":
+            raise Exception("The resource you requested does not exist.")
+        raise
 
     return response["Metadata"]
 
 
+def validate_metadata(s3_metadata: dict):
+    if s3_metadata.get("mop") not in _MOPS:
+        raise InvalidEventError(f"Invalid mop: {s3_metadata.get('mop')!r}")
+    username = s3_metadata.get("username")
+    if not username or "/" in username:
+        raise InvalidEventError(f"Invalid username: {username!r}")
+    if not _MODEL_NAME.fullmatch(s3_metadata.get("model_name") or ""):
+        raise InvalidEventError(
+            f"Invalid model name: {s3_metadata.get('model_name')!r}"
+        )
+
+
 def handler(event: dict, context):
-    logger.debug("Event: %s", json.dumps(event))
+    # don't serialize the whole event unless it's going to be logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Event: %s", json.dumps(event))
+
+    # creating clients isn't thread-safe, so do it before fanning out
+    _s3()
+    _dynamodb()
 
-    for record in event["Records"]:
+    # every record of an invocation gets the same timestamp
+    now = datetime.utcnow().isoformat()
+    futures = {
+        _EXECUTOR.submit(main, record, now): record for record in event["Records"]
+    }
+    failed = []
+    for future in as_completed(futures):
         try:
-            main(record)
-        except Exception as err:
-            logger.error(
-                "Error: %s", json.dumps({"event": record, "error": err}, default=str)
-            )
-            logger.exception(err)
+            future.result()
+        except InvalidEventError as err:
+            # nothing to retry, the upload itself is malformed
+            key = futures[future].get("s3", {}).get("object", {}).get("key")
+            logger.warning("Skipping %s: %s", key, err)
+        except Exception:
+            key = futures[future].get("s3", {}).get("object", {}).get("key")
+            logger.exception("Error processing %s", key)
+            failed.append(key)
 
+    # fail the invocation so the event is retried; records that did succeed
+    # are skipped by their upload claim
+    if failed:
+        raise Exception(f"Failed to process: {failed}")
 
-def move_object(from_: s3_tuple, to_: s3_tuple):
-    # Copy object A as object B
-    copy_source = {"Bucket": from_.bucket, "Key": from_.key}
-    bucket = s3r.Bucket(to_.bucket)
-    bucket.copy(copy_source, to_.key)
 
-    # Delete the former object A
-    s3r.Object(from_.bucket, from_.key).delete()
+def copy_object(from_: S3Ref, to_: S3Ref):
+    if (from_.bucket, from_.key) == (to_.bucket, to_.key):
+        return
+    if from_.bucket == to_.bucket:
+        logger.debug("Copying within %s", from_.bucket)
 
+    # Copy object A as object B, server side and in a single request (objects
+    # up to 5 GB), instead of through the managed transfer
+    _s3().copy_object(
+        Bucket=to_.bucket,
+        Key=to_.key,
+        CopySource={"Bucket": from_.bucket, "Key": from_.key, **from_.versioned()},
+        MetadataDirective="COPY",
+    )
 
-def main(event: dict):
-    _REGION_NAME = event["awsRegion"]
-    MODELS_S3_BUCKET = f"{_PREFIX}-models-{_REGION_NAME}"
 
+def mark_staged(object_: S3Ref):
+    _s3().put_object_tagging(
+        Bucket=object_.bucket,
+        Key=object_.key,
+        Tagging={"TagSet": [_STAGED_TAG]},
+        **object_.versioned(),
+    )
+
+
+def main(event: dict, now: str):
     s3_bucket = event["s3"]["bucket"]["name"]
     s3_object = event["s3"]["object"]["key"]
+    # read, copy and tag the version that was uploaded, even if the same
+    # presigned POST has been used again since
+    from_ = S3Ref(s3_bucket, s3_object, event["s3"]["object"].get("versionId"))
 
     # get metadata
-    s3_metadata = get_attributes(bucket_name=s3_bucket, object_name=s3_object)
-    logger.debug("s3_metadata: %s", json.dumps(s3_metadata, default=str))
+    s3_metadata = get_attributes(
+        bucket_name=s3_bucket, object_name=s3_object, version_id=from_.version_id
+    )
+    logger.debug("s3_metadata: %s", s3_metadata)
+    validate_metadata(s3_metadata)
+
+    claim = {
+        "username": s3_metadata["username"],
+        "model_name": s3_metadata["model_name"],
+        "for_model": s3_metadata["mop"] == "model",
+        "upload": upload_id(event),
+    }
+    if not claim_upload(**claim):
+        logger.info(
+            "Skipping %s: already processed, or its model doesn't exist", s3_object
+        )
+        return
 
     # move object
     if s3_metadata["mop"] == "model":
         s3_key = f"{s3_metadata['username']}/{s3_metadata['model_name']}"
     else:
         s3_key = f"{s3_metadata['username']}/{s3_metadata['model_name']}_preprocessing"
-    from_ = s3_tuple(s3_bucket, s3_object)
-    to_ = s3_tuple(MODELS_S3_BUCKET, s3_key)
-    move_object(from_=from_, to_=to_)
-
-    # update db
-    upsert_ml_model_record(
-        username=s3_metadata["username"],
-        model_name=s3_metadata["model_name"],
-        for_model=s3_metadata["mop"] == "model",
-        bucket=s3_bucket,
-        key=s3_key,
-    )
+    to_ = S3Ref(models_bucket(event["awsRegion"]), s3_key)
+
+    try:
+        copy_object(from_=from_, to_=to_)
+
+        # update db, only once the object is in place
+        upsert_ml_model_record(
+            username=s3_metadata["username"],
+            model_name=s3_metadata["model_name"],
+            for_model=s3_metadata["mop"] == "model",
+            bucket=s3_bucket,
+            key=s3_key,
+            updated_at=now,
+        )
+    except Exception:
+        # let the retry of the event try again
+        release_upload(**claim)
+        raise
+
+    # leave deleting the staged object to the lifecycle rule, unless it's
+    # already where it belongs (single-bucket setups)
+    if (from_.bucket, from_.key) != (to_.bucket, to_.key):
+        mark_staged(from_)